@@ -1,508 +1,733 @@
-#!/usr/bin/env python3
-import os, sys, time, json, base64, math, re
-import requests
-from collections import Counter
-from datetime import datetime, date, timedelta, timezone
-from zoneinfo import ZoneInfo
-from supabase import create_client, Client
-
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import (
-    load_pem_private_key, load_ssh_private_key, load_der_private_key
-)
-
-# ===================== CONFIG FROM ENV =====================
-
-API_HOST = "https://api.elections.kalshi.com/trade-api/v2"
-API_KEY_ID = os.getenv("KALSHI_API_KEY_ID")
-PRIVATE_KEY = os.getenv("KALSHI_PRIVATE_KEY", "").encode()
-PRIVATE_KEY_PASSPHRASE = os.getenv("KALSHI_KEY_PASSPHRASE")
-if PRIVATE_KEY_PASSPHRASE:
-    PRIVATE_KEY_PASSPHRASE = PRIVATE_KEY_PASSPHRASE.encode()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-PROXIES = None
-proxy_http = os.getenv("HTTP_PROXY")
-if proxy_http:
-    PROXIES = {"http": proxy_http, "https": proxy_http}
-
-CORP_CA_PATH = os.getenv("CA_BUNDLE_PATH")
-TIMEZONE = os.getenv("TIMEZONE", "America/New_York")
-LOOKBACK_DAYS = int(os.getenv("LOOKBACK_DAYS", "3"))
-
-# Reduced batch sizes to prevent rate limiting and URL length issues
-TICKER_BATCH = 35  # Small batches to avoid long URLs
-EVENT_BATCH = 35    # Small batches to avoid long URLs
-
-# Rate limiting delays (seconds)
-REQUEST_DELAY = 0.35  # Wait 1 second between requests
-RETRY_BASE_DELAY = 1.4  # Base delay for exponential backoff
-
-# Maximum URL length before splitting batch
-MAX_URL_LENGTH = 2000
-
-# Regex patterns
-SPORTS_REGEX = re.compile(
-    r"(nfl|mlb|nba|wnba|nhl|laliga|f1|pga|bundesliga|ucl|epl|mls|ligue1|seriea|fifa|ncaa|nascar|atp|wta|mensingles|womensingles|kxmarmad|kxwmarmad|ncaab|ncaaf)",
-    re.IGNORECASE
-)
-
-NFL_REGEX = re.compile(r"nfl", re.IGNORECASE)
-MLB_REGEX = re.compile(r"mlb", re.IGNORECASE)
-WNBA_REGEX = re.compile(r"wnba", re.IGNORECASE)
-NBA_REGEX = re.compile(r"nba", re.IGNORECASE)
-NHL_REGEX = re.compile(r"nhl", re.IGNORECASE)
-SOCCER_REGEX = re.compile(r"(laliga|bundesliga|ucl|epl|mls|ligue1|seriea|fifa)", re.IGNORECASE)
-GOLF_REGEX = re.compile(r"pga", re.IGNORECASE)
-MOTORSPORT_REGEX = re.compile(r"(f1|nascar)", re.IGNORECASE)
-TENNIS_REGEX = re.compile(r"(atp|wta|mensingles|womensingles)", re.IGNORECASE)
-NCAAM_REGEX = re.compile(r"(kxmarmad|ncaam|ncaab)", re.IGNORECASE)
-NCAAW_REGEX = re.compile(r"(kxwmarmad|ncaaw)", re.IGNORECASE)
-NCAAF_REGEX = re.compile(r"ncaaf", re.IGNORECASE)
-
-SPORT_CATEGORIES = ["nfl", "mlb", "nba", "wnba", "nhl", "soccer", "golf", "motorsport", "tennis", "ncaam", "ncaaw", "ncaaf"]
-
-# =================== END CONFIG ====================
-
-
-def _log(msg: str) -> None:
-    print(msg, flush=True)
-
-
-def _load_private_key():
-    """Try PEM -> OpenSSH -> DER(base64)."""
-    raw = PRIVATE_KEY.strip()
-    try:
-        return load_pem_private_key(raw, password=PRIVATE_KEY_PASSPHRASE)
-    except Exception:
-        pass
-    try:
-        return load_ssh_private_key(raw, password=PRIVATE_KEY_PASSPHRASE)
-    except Exception:
-        pass
-    try:
-        der = base64.b64decode(raw)
-        return load_der_private_key(der, password=PRIVATE_KEY_PASSPHRASE)
-    except Exception as e:
-        raise ValueError("Could not parse PRIVATE_KEY as PEM/OpenSSH/DER.") from e
-
-
-def _kalshi_headers(method: str, path: str, key):
-    ts_ms = str(int(time.time() * 1000))
-    msg = (ts_ms + method.upper() + path).encode("utf-8")
-    sig = key.sign(
-        msg,
-        padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
-        hashes.SHA256(),
-    )
-    return {
-        "KALSHI-ACCESS-KEY": API_KEY_ID,
-        "KALSHI-ACCESS-TIMESTAMP": ts_ms,
-        "KALSHI-ACCESS-SIGNATURE": base64.b64encode(sig).decode("ascii"),
-    }
-
-
-def _api_request_with_retry(session, method, url, headers, params=None, max_retries=5):
-    """Make API request with exponential backoff retry on rate limit."""
-    for attempt in range(max_retries):
-        try:
-            r = session.request(method, url, headers=headers, params=params, timeout=60)
-            
-            if r.status_code == 429:  # Rate limited
-                wait_time = RETRY_BASE_DELAY * (2 ** attempt)  # 2s, 4s, 8s, 16s, 32s
-                _log(f"  ⚠️  Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
-                time.sleep(wait_time)
-                continue
-            
-            r.raise_for_status()
-            return r
-            
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429 and attempt < max_retries - 1:
-                wait_time = RETRY_BASE_DELAY * (2 ** attempt)
-                _log(f"  ⚠️  Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
-                time.sleep(wait_time)
-            else:
-                raise
-    
-    raise Exception("Max retries exceeded for API request")
-
-
-def _daterange_inclusive(start_d: date, end_d: date):
-    cur = start_d
-    while cur <= end_d:
-        yield cur
-        cur += timedelta(days=1)
-
-
-def _to_utc_bounds_for_local_day(d: date, tz: ZoneInfo):
-    local_start = datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz)
-    local_end = local_start + timedelta(days=1)
-    return int(local_start.timestamp()), int(local_end.timestamp())
-
-
-def _chunks(seq, n):
-    for i in range(0, len(seq), n):
-        yield seq[i:i+n]
-
-
-def parse_ts(v) -> int:
-    if isinstance(v, (int, float)):
-        x = float(v)
-        return int(x / 1000.0) if x > 1e12 else int(x)
-    if isinstance(v, str):
-        s = v.strip()
-        if s.isdigit():
-            x = float(s)
-            return int(x / 1000.0) if x > 1e12 else int(x)
-        if s.endswith("Z"):
-            s = s[:-1] + "+00:00"
-        try:
-            dt = datetime.fromisoformat(s)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return int(dt.timestamp())
-        except Exception:
-            pass
-        for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"):
-            try:
-                dt = datetime.strptime(s, fmt)
-                return int(dt.timestamp())
-            except Exception:
-                continue
-    raise ValueError(f"Unrecognized timestamp format: {v!r}")
-
-
-def _get_all_trades(min_ts: int, max_ts: int, session: requests.Session, key):
-    path = "/markets/trades"
-    url = f"{API_HOST}{path}"
-    cursor = None
-    trades = []
-    page = 0
-    _log(f"Fetching trades in UTC span [{min_ts}, {max_ts}) ...")
-    
-    while True:
-        params = {"limit": 1000, "min_ts": min_ts, "max_ts": max_ts}
-        if cursor:
-            params["cursor"] = cursor
-        
-        headers = _kalshi_headers("GET", path, key)
-        r = _api_request_with_retry(session, "GET", url, headers, params)
-        
-        data = r.json()
-        batch = data.get("trades", [])
-        trades.extend(batch)
-        cursor = data.get("cursor")
-        page += 1
-        
-        if page % 100 == 0:
-            _log(f"  ▸ page {page}: +{len(batch)} trades (total: {len(trades)})")
-        
-        # Small delay to be nice to the API
-        time.sleep(0.1)
-        
-        if not cursor:
-            break
-    
-    _log(f"Total trades fetched: {len(trades)}")
-    return trades
-
-
-def _lookup_markets(tickers, session: requests.Session, key):
-    path = "/markets"
-    url = f"{API_HOST}{path}"
-    out = {}
-    
-    # Dynamically adjust batch size based on ticker length
-    if tickers:
-        sample_tickers = list(tickers)[:min(100, len(tickers))]
-        avg_ticker_len = sum(len(t) for t in sample_tickers) / len(sample_tickers)
-        
-        # Adjust batch size based on average ticker length
-        if avg_ticker_len > 100:
-            dynamic_batch_size = 15
-        elif avg_ticker_len > 50:
-            dynamic_batch_size = 20
-        else:
-            dynamic_batch_size = TICKER_BATCH
-        
-        _log(f"Average ticker length: {avg_ticker_len:.1f} chars, using batch size: {dynamic_batch_size}")
-    else:
-        dynamic_batch_size = TICKER_BATCH
-    
-    batches = math.ceil(len(tickers) / dynamic_batch_size) if tickers else 0
-    _log(f"Fetching market metadata for {len(tickers)} tickers in {batches} batch(es)...")
-    
-    for i, batch in enumerate(_chunks(list(tickers), dynamic_batch_size), start=1):
-        # Estimate URL length
-        ticker_param = ",".join(batch)
-        estimated_url_len = len(url) + len("?tickers=") + len(ticker_param)
-        
-        # If URL would be too long, split batch further
-        if estimated_url_len > MAX_URL_LENGTH:
-            _log(f"  ⚠️  Batch {i}: URL would be {estimated_url_len} chars, splitting into smaller chunks...")
-            
-            # Split into individual ticker requests if needed
-            for single_ticker in batch:
-                headers = _kalshi_headers("GET", path, key)
-                try:
-                    r = _api_request_with_retry(session, "GET", url, headers, params={"tickers": single_ticker})
-                    markets = r.json().get("markets", [])
-                    
-                    for m in markets:
-                        tkr = m.get("ticker")
-                        cat = (m.get("category") or "").strip()
-                        evt = (m.get("event_ticker") or m.get("eventTicker") or "").strip()
-                        if tkr:
-                            out[tkr] = {"category": cat, "event_ticker": evt}
-                    
-                    time.sleep(0.3)  # Short delay between individual requests
-                except Exception as e:
-                    _log(f"  ✗ Error fetching ticker {single_ticker}: {e}")
-            
-            if i < batches:
-                time.sleep(REQUEST_DELAY)
-            continue
-        
-        # Normal batch processing
-        _log(f"  ▸ batch {i}/{batches}: {len(batch)} tickers (URL: {estimated_url_len} chars)")
-        
-        headers = _kalshi_headers("GET", path, key)
-        
-        try:
-            r = _api_request_with_retry(session, "GET", url, headers, params={"tickers": ticker_param})
-            markets = r.json().get("markets", [])
-            
-            for m in markets:
-                tkr = m.get("ticker")
-                cat = (m.get("category") or "").strip()
-                evt = (m.get("event_ticker") or m.get("eventTicker") or "").strip()
-                if tkr:
-                    out[tkr] = {"category": cat, "event_ticker": evt}
-        except Exception as e:
-            _log(f"  ✗ Error in batch {i}: {e}")
-            # Try individual tickers as fallback
-            for single_ticker in batch:
-                try:
-                    headers = _kalshi_headers("GET", path, key)
-                    r = _api_request_with_retry(session, "GET", url, headers, params={"tickers": single_ticker})
-                    markets = r.json().get("markets", [])
-                    
-                    for m in markets:
-                        tkr = m.get("ticker")
-                        cat = (m.get("category") or "").strip()
-                        evt = (m.get("event_ticker") or m.get("eventTicker") or "").strip()
-                        if tkr:
-                            out[tkr] = {"category": cat, "event_ticker": evt}
-                    
-                    time.sleep(0.3)
-                except Exception as single_e:
-                    _log(f"  ✗ Error fetching single ticker {single_ticker}: {single_e}")
-        
-        # Rate limiting delay between batches
-        if i < batches:
-            time.sleep(REQUEST_DELAY)
-    
-    return out
-
-
-def _lookup_event_categories(event_tickers, session: requests.Session, key):
-    path = "/events"
-    url = f"{API_HOST}{path}"
-    out = {}
-    if not event_tickers:
-        return out
-    
-    batches = math.ceil(len(event_tickers) / EVENT_BATCH)
-    _log(f"Fetching event categories for {len(event_tickers)} event_ticker(s) in {batches} batch(es)...")
-    
-    for i, batch in enumerate(_chunks(list(event_tickers), EVENT_BATCH), start=1):
-        _log(f"  ▸ batch {i}/{batches}: {len(batch)} events")
-        
-        headers = _kalshi_headers("GET", path, key)
-        
-        try:
-            r = _api_request_with_retry(session, "GET", url, headers, params={"event_tickers": ",".join(batch)})
-            events = r.json().get("events", [])
-            
-            for e in events:
-                evt = (e.get("ticker") or e.get("event_ticker") or "").strip()
-                cat = (e.get("category") or "").strip()
-                if evt:
-                    out[evt] = cat
-        except Exception as e:
-            _log(f"  ✗ Error in event batch {i}: {e}")
-        
-        # Rate limiting delay between batches
-        if i < batches:
-            time.sleep(REQUEST_DELAY)
-    
-    return out
-
-
-def classify_sport(ticker: str, category: str, event_ticker: str) -> str:
-    for field in (ticker, category, event_ticker):
-        if not field:
-            continue
-        if WNBA_REGEX.search(field):
-            return "wnba"
-        if NFL_REGEX.search(field):
-            return "nfl"
-        if MLB_REGEX.search(field):
-            return "mlb"
-        if NBA_REGEX.search(field):
-            return "nba"
-        if NHL_REGEX.search(field):
-            return "nhl"
-        if SOCCER_REGEX.search(field):
-            return "soccer"
-        if GOLF_REGEX.search(field):
-            return "golf"
-        if MOTORSPORT_REGEX.search(field):
-            return "motorsport"
-        if TENNIS_REGEX.search(field):
-            return "tennis"
-        if NCAAM_REGEX.search(field):
-            return "ncaam"
-        if NCAAW_REGEX.search(field):
-            return "ncaaw"
-        if NCAAF_REGEX.search(field):
-            return "ncaaf"
-    return ""
-
-
-def main():
-    if not all([API_KEY_ID, PRIVATE_KEY, SUPABASE_URL, SUPABASE_SERVICE_KEY]):
-        _log("❌ Missing required environment variables")
-        _log("Required: KALSHI_API_KEY_ID, KALSHI_PRIVATE_KEY, SUPABASE_URL, SUPABASE_SERVICE_KEY")
-        sys.exit(1)
-
-    tz = ZoneInfo(TIMEZONE)
-    
-    end_d = date.today() - timedelta(days=1)
-    start_d = end_d - timedelta(days=LOOKBACK_DAYS - 1)
-    
-    _log(f"Processing dates: {start_d} to {end_d} (timezone: {TIMEZONE}, lookback: {LOOKBACK_DAYS} days)")
-
-    first_start_ts, _ = _to_utc_bounds_for_local_day(start_d, tz)
-    _, last_end_ts = _to_utc_bounds_for_local_day(end_d, tz)
-
-    key = _load_private_key()
-    
-    session = requests.Session()
-    session.headers.update({"User-Agent": "KalshiDailyCron/1.0"})
-    if PROXIES:
-        session.proxies.update(PROXIES)
-        _log(f"Using proxies: {PROXIES}")
-    if CORP_CA_PATH:
-        session.verify = CORP_CA_PATH
-
-    trades = _get_all_trades(first_start_ts, last_end_ts, session, key)
-
-    _log("Bucketing trades by local day...")
-    totals_by_day = {}
-    ticker_by_day = {}
-    unique_tickers = set()
-
-    for t in trades:
-        ts = None
-        for fld in ("created_time", "created_ts", "ts", "timestamp"):
-            if fld in t and t[fld] is not None:
-                try:
-                    ts = parse_ts(t[fld])
-                    break
-                except Exception:
-                    continue
-        if ts is None:
-            continue
-
-        local_dt = datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(tz)
-        day_str = local_dt.date().isoformat()
-
-        qty = int(t.get("count", 0) or 0)
-        totals_by_day[day_str] = totals_by_day.get(day_str, 0) + qty
-
-        tk = t.get("ticker")
-        if tk:
-            unique_tickers.add(tk)
-            dmap = ticker_by_day.setdefault(day_str, {})
-            dmap[tk] = dmap.get(tk, 0) + qty
-
-    for d in _daterange_inclusive(start_d, end_d):
-        ds = d.isoformat()
-        totals_by_day.setdefault(ds, 0)
-        ticker_by_day.setdefault(ds, {})
-
-    _log(f"Unique tickers: {len(unique_tickers)}")
-
-    markets_map = _lookup_markets(unique_tickers, session, key)
-    blanks_evt = {info["event_ticker"] for info in markets_map.values() if not info["category"] and info["event_ticker"]}
-    event_cat_map = _lookup_event_categories(blanks_evt, session, key) if blanks_evt else {}
-
-    final_category = {}
-    for tk, info in markets_map.items():
-        cat = (info.get("category") or "").strip()
-        evt = info.get("event_ticker", "")
-        if cat:
-            final_category[tk] = (cat, "market", evt)
-        else:
-            ev_cat = (event_cat_map.get(evt, "") or "").strip() if evt else ""
-            if ev_cat:
-                final_category[tk] = (ev_cat, "event", evt)
-            else:
-                final_category[tk] = ("", "none", evt)
-
-    _log("Computing daily volumes...")
-    rows = []
-    for d in sorted(totals_by_day.keys()):
-        total = totals_by_day[d]
-        per_ticker = ticker_by_day[d]
-        
-        sport_volumes = {sport: 0 for sport in SPORT_CATEGORIES}
-        sports_total = 0
-
-        for tk, q in per_ticker.items():
-            cat, _src, evt = final_category.get(tk, ("", "none", ""))
-            sport = classify_sport(tk, cat, evt)
-            if sport:
-                sport_volumes[sport] += q
-                sports_total += q
-
-        pct = (sports_total / total * 100.0) if total else 0.0
-        row = {
-            "date": d,
-            "total_volume": total,
-            "sports_volume": sports_total,
-            "sports_pct": round(pct, 4),
-            **{f"{sport}_volume": sport_volumes[sport] for sport in SPORT_CATEGORIES},
-        }
-        rows.append(row)
-        _log(f"  {d}: total={total:,} sports={sports_total:,} ({pct:.2f}%)")
-
-    _log(f"\nUploading {len(rows)} rows to Supabase...")
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    
-    for row in rows:
-        try:
-            result = supabase.table("daily_volumes").upsert(row).execute()
-            _log(f"  ✓ Upserted {row['date']}")
-        except Exception as e:
-            _log(f"  ✗ Error upserting {row['date']}: {e}")
-
-    _log("\n✅ Done!")
-
-
-if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        _log(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
-
-
-
+#!/usr/bin/env python3
+import os, sys, time, base64, re, ssl, asyncio, functools, threading
+import aiohttp
+import numpy as np
+import orjson
+import pandas as pd
+import requests
+from aiolimiter import AsyncLimiter
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from urllib.parse import urlparse
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo
+from supabase import create_client, Client
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key, load_ssh_private_key, load_der_private_key
+)
+
+# ===================== CONFIG FROM ENV =====================
+
+API_HOST = "https://api.elections.kalshi.com/trade-api/v2"
+API_KEY_ID = os.getenv("KALSHI_API_KEY_ID")
+PRIVATE_KEY = os.getenv("KALSHI_PRIVATE_KEY", "").encode()
+PRIVATE_KEY_PASSPHRASE = os.getenv("KALSHI_KEY_PASSPHRASE")
+if PRIVATE_KEY_PASSPHRASE:
+    PRIVATE_KEY_PASSPHRASE = PRIVATE_KEY_PASSPHRASE.encode()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+PROXIES = None
+proxy_http = os.getenv("HTTP_PROXY")
+if proxy_http:
+    PROXIES = {"http": proxy_http, "https": proxy_http}
+
+CORP_CA_PATH = os.getenv("CA_BUNDLE_PATH")
+TIMEZONE = os.getenv("TIMEZONE", "America/New_York")
+LOOKBACK_DAYS = int(os.getenv("LOOKBACK_DAYS", "3"))
+
+# Hard caps on items per metadata request; URL length is the real packing limit
+TICKER_BATCH = 50
+EVENT_BATCH = 50
+
+# Rate limiting
+REST_REQUESTS_PER_SECOND = 8  # Token bucket for the sync metadata session
+LOOKUP_WORKERS = 8  # Concurrent metadata batches (paced by the shared limiter)
+RETRY_BASE_DELAY = 1.4  # Base delay for exponential backoff when Retry-After is absent
+
+# Trade pagination: one fetch task per local day, bounded by the connector
+TRADE_CONCURRENCY = 16
+TRADE_REQUESTS_PER_SECOND = 8  # Token bucket to stay under Kalshi's per-second cap
+
+# Maximum URL length before splitting batch
+MAX_URL_LENGTH = 2000
+
+# Regex patterns
+SPORTS_REGEX = re.compile(
+    r"(nfl|mlb|nba|wnba|nhl|laliga|f1|pga|bundesliga|ucl|epl|mls|ligue1|seriea|fifa|ncaa|nascar|atp|wta|mensingles|womensingles|kxmarmad|kxwmarmad|ncaab|ncaaf)",
+    re.IGNORECASE
+)
+
+# One alternation instead of 12 separate searches per field; ordering matters
+# (wnba before nba, ncaab before nba, etc.) and mirrors the old cascade.
+SPORT_PATTERNS = [
+    ("wnba", r"wnba"),
+    ("nfl", r"nfl"),
+    ("mlb", r"mlb"),
+    ("nba", r"nba"),
+    ("nhl", r"nhl"),
+    ("soccer", r"laliga|bundesliga|ucl|epl|mls|ligue1|seriea|fifa"),
+    ("golf", r"pga"),
+    ("motorsport", r"f1|nascar"),
+    ("tennis", r"atp|wta|mensingles|womensingles"),
+    ("ncaam", r"kxmarmad|ncaam|ncaab"),
+    ("ncaaw", r"kxwmarmad|ncaaw"),
+    ("ncaaf", r"ncaaf"),
+    ("combat", r"ufc|boxing"),
+]
+
+@functools.cache
+def _sport_union():
+    """Union regex compiled on first use, so importing the module stays cheap."""
+    return re.compile(
+        "|".join(f"(?P<{name}>{pat})" for name, pat in SPORT_PATTERNS),
+        re.IGNORECASE
+    )
+
+SPORT_CATEGORIES = ["nfl", "mlb", "nba", "wnba", "nhl", "soccer", "golf", "motorsport", "tennis", "ncaam", "ncaaw", "ncaaf", "combat"]
+
+# =================== END CONFIG ====================
+
+
+def _log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+class RateLimiter:
+    """Synchronous token bucket: `rate` acquisitions per `per` seconds.
+
+    acquire() returns immediately while budget remains and only sleeps for
+    the exact refill time when the bucket is dry, unlike a fixed inter-request
+    delay which always pays the worst case. `capacity` sets the burst
+    headroom (tokens that can bank up while the bucket is idle); it defaults
+    to one second's worth of rate.
+    """
+
+    def __init__(self, rate: int, per: float = 1.0, capacity: int = None):
+        self.rate = rate
+        self.per = per
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()  # Shared across lookup worker threads
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * (self.rate / self.per))
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) * self.per / self.rate
+            time.sleep(wait)
+
+
+_REST_LIMITER = RateLimiter(REST_REQUESTS_PER_SECOND)
+
+# RSA-PSS signing is ~ms per call; keep it off the event loop so it overlaps
+# with in-flight network waits instead of serializing behind them.
+_SIGNER_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="signer")
+
+
+def _retry_wait(headers, attempt: int) -> float:
+    """Prefer the server's Retry-After over blind exponential backoff."""
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return RETRY_BASE_DELAY * (2 ** attempt)
+
+
+@functools.cache
+def _load_private_key():
+    """Try PEM -> OpenSSH -> DER(base64). Cached: parse the key once per process.
+
+    Keep this process-local — if metadata fetches ever move to
+    multiprocessing, children must load their own copy.
+    """
+    raw = PRIVATE_KEY.strip()
+    try:
+        return load_pem_private_key(raw, password=PRIVATE_KEY_PASSPHRASE)
+    except Exception:
+        pass
+    try:
+        return load_ssh_private_key(raw, password=PRIVATE_KEY_PASSPHRASE)
+    except Exception:
+        pass
+    try:
+        der = base64.b64decode(raw)
+        return load_der_private_key(der, password=PRIVATE_KEY_PASSPHRASE)
+    except Exception as e:
+        raise ValueError("Could not parse PRIVATE_KEY as PEM/OpenSSH/DER.") from e
+
+
+# Algorithm descriptors are stateless; build them once instead of per signature
+_PSS_PADDING = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+_SHA256 = hashes.SHA256()
+
+
+def _kalshi_headers(method: str, path: str, key):
+    ts_ms = str(int(time.time() * 1000))
+    msg = (ts_ms + method.upper() + path).encode("utf-8")
+    sig = key.sign(msg, _PSS_PADDING, _SHA256)
+    return {
+        "KALSHI-ACCESS-KEY": API_KEY_ID,
+        "KALSHI-ACCESS-TIMESTAMP": ts_ms,
+        "KALSHI-ACCESS-SIGNATURE": base64.b64encode(sig).decode("ascii"),
+    }
+
+
+_API_PATH_PREFIX = urlparse(API_HOST).path
+
+
+class KalshiAuth(AuthBase):
+    """Signs each PreparedRequest at send time, so call sites don't build headers.
+
+    Signing at send time also means every retry inside the session gets a
+    fresh timestamp. The signed path keeps the convention _kalshi_headers
+    call sites used (endpoint path without the API prefix).
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self, r):
+        path = urlparse(r.url).path
+        if path.startswith(_API_PATH_PREFIX):
+            path = path[len(_API_PATH_PREFIX):]
+        r.headers.update(_kalshi_headers(r.method, path, self.key))
+        return r
+
+
+def _api_request_with_retry(session, method, url, headers=None, params=None, max_retries=5):
+    """Make API request with exponential backoff retry on rate limit.
+
+    Auth headers come from session.auth (KalshiAuth); `headers` is only for extras.
+    """
+    for attempt in range(max_retries):
+        try:
+            _REST_LIMITER.acquire()
+            r = session.request(method, url, headers=headers, params=params, timeout=60)
+
+            if r.status_code == 429:  # Rate limited
+                wait_time = _retry_wait(r.headers, attempt)
+                _log(f"  ⚠️  Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                time.sleep(wait_time)
+                continue
+
+            r.raise_for_status()
+            return r
+
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 429 and attempt < max_retries - 1:
+                wait_time = _retry_wait(e.response.headers, attempt)
+                _log(f"  ⚠️  Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                time.sleep(wait_time)
+            else:
+                raise
+    
+    raise Exception("Max retries exceeded for API request")
+
+
+def _daterange_inclusive(start_d: date, end_d: date):
+    cur = start_d
+    while cur <= end_d:
+        yield cur
+        cur += timedelta(days=1)
+
+
+def _to_utc_bounds_for_local_day(d: date, tz: ZoneInfo):
+    local_start = datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz)
+    local_end = local_start + timedelta(days=1)
+    return int(local_start.timestamp()), int(local_end.timestamp())
+
+
+def _pack_by_url_length(items, base_len: int, max_items: int):
+    """Greedily pack items so each comma-joined request URL stays under MAX_URL_LENGTH."""
+    batch = []
+    length = base_len
+    for item in items:
+        extra = len(item) + 1  # comma separator
+        if batch and (length + extra > MAX_URL_LENGTH or len(batch) >= max_items):
+            yield batch
+            batch = []
+            length = base_len
+        batch.append(item)
+        length += extra
+    if batch:
+        yield batch
+
+
+def _chunks(it, n):
+    """Yield lists of up to n items from any iterable, without copying it whole."""
+    it = iter(it)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+_EPOCH_MS_THRESHOLD = 1_000_000_000_000  # epoch values above this are milliseconds
+
+
+@functools.lru_cache(maxsize=200_000)
+def parse_ts(v) -> int:
+    """Timestamp -> epoch seconds. Cached: trades repeat second-level timestamps heavily."""
+    # Kalshi sends ISO-8601 strings, so take the string branch first;
+    # fromisoformat on 3.11+ accepts the trailing "Z" and fractional seconds
+    # directly, so no strptime fallback is needed.
+    if isinstance(v, str):
+        s = v.strip()
+        if s.isdigit():
+            x = int(s)
+            return x // 1000 if x > _EPOCH_MS_THRESHOLD else x
+        try:
+            dt = datetime.fromisoformat(s)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return int(dt.timestamp())
+        except ValueError:
+            pass
+    elif isinstance(v, (int, float)):
+        x = float(v)
+        return int(x / 1000.0) if x > _EPOCH_MS_THRESHOLD else int(x)
+    raise ValueError(f"Unrecognized timestamp format: {v!r}")
+
+
+async def _async_request_with_retry(session, limiter, method, path, params, key, max_retries=5):
+    """aiohttp twin of _api_request_with_retry: token-bucket paced, retries on 429."""
+    url = f"{API_HOST}{path}"
+    for attempt in range(max_retries):
+        async with limiter:
+            # Headers are timestamp-dependent, so sign fresh per attempt —
+            # but in the signer pool, not on the loop thread
+            headers = await asyncio.get_running_loop().run_in_executor(
+                _SIGNER_POOL, _kalshi_headers, method, path, key
+            )
+            async with session.request(method, url, headers=headers, params=params) as r:
+                if r.status == 429:  # Rate limited
+                    wait_time = _retry_wait(r.headers, attempt)
+                    _log(f"  ⚠️  Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                    await asyncio.sleep(wait_time)
+                    continue
+                r.raise_for_status()
+                return orjson.loads(await r.read())
+
+    raise Exception("Max retries exceeded for API request")
+
+
+async def _fetch_trades_window(session, limiter, min_ts: int, max_ts: int, key, on_batch):
+    """Walk the cursor chain for one UTC span, handing each page to on_batch.
+
+    Pages are discarded after the callback, so the working set stays one page
+    deep. on_batch runs on the event loop thread, so calls are serialized.
+    """
+    path = "/markets/trades"
+    cursor = None
+    fetched = 0
+    page = 0
+
+    while True:
+        params = {"limit": "1000", "min_ts": str(min_ts), "max_ts": str(max_ts)}
+        if cursor:
+            params["cursor"] = cursor
+
+        data = await _async_request_with_retry(session, limiter, "GET", path, params, key)
+        batch = data.get("trades", [])
+        on_batch(batch)
+        fetched += len(batch)
+        cursor = data.get("cursor")
+        page += 1
+
+        if page % 100 == 0:
+            _log(f"  ▸ span [{min_ts}, {max_ts}) page {page}: +{len(batch)} trades (total: {fetched})")
+
+        if not cursor:
+            break
+
+    return fetched
+
+
+async def _get_all_trades_async(start_d: date, end_d: date, tz: ZoneInfo, key, on_batch):
+    limiter = AsyncLimiter(TRADE_REQUESTS_PER_SECOND, 1)
+    ssl_ctx = ssl.create_default_context(cafile=CORP_CA_PATH) if CORP_CA_PATH else None
+    connector = aiohttp.TCPConnector(limit_per_host=TRADE_CONCURRENCY, keepalive_timeout=60, ssl=ssl_ctx)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={"User-Agent": "KalshiDailyCron/1.0"},
+        trust_env=True,  # Picks up HTTP_PROXY / HTTPS_PROXY like the requests session
+    ) as session:
+        tasks = []
+        for d in _daterange_inclusive(start_d, end_d):
+            min_ts, max_ts = _to_utc_bounds_for_local_day(d, tz)
+            tasks.append(_fetch_trades_window(session, limiter, min_ts, max_ts, key, on_batch))
+        counts = await asyncio.gather(*tasks)
+
+    return sum(counts)
+
+
+def _parse_ts_series(raw: pd.Series) -> pd.Series:
+    """Vectorized timestamp parse, falling back to parse_ts for odd values."""
+    ts = pd.to_datetime(raw, utc=True, format="ISO8601", errors="coerce")
+    bad = ts.isna() & raw.notna()
+    if bad.any():
+        def _epoch(v):
+            try:
+                return parse_ts(v)
+            except Exception:
+                return None
+        ts = ts.where(~bad, pd.to_datetime(raw[bad].map(_epoch), unit="s", utc=True))
+    return ts
+
+
+def _get_all_trades(start_d: date, end_d: date, tz: ZoneInfo, key, on_batch):
+    _log(f"Fetching trades for {start_d}..{end_d} (one task per local day, {TRADE_CONCURRENCY} max connections)...")
+    total = asyncio.run(_get_all_trades_async(start_d, end_d, tz, key, on_batch))
+    _log(f"Total trades fetched: {total}")
+    return total
+
+
+def _collect_markets(markets, out):
+    for m in markets:
+        tkr = m.get("ticker")
+        cat = (m.get("category") or "").strip()
+        evt = (m.get("event_ticker") or m.get("eventTicker") or "").strip()
+        if tkr:
+            out[tkr] = {"category": cat, "event_ticker": evt}
+
+
+def _fetch_market_batch(session: requests.Session, batch):
+    """Fetch one /markets batch, splitting or falling back to single tickers on trouble."""
+    path = "/markets"
+    url = f"{API_HOST}{path}"
+    out = {}
+
+    def _fetch_single(single_ticker):
+        r = _api_request_with_retry(session, "GET", url, params={"tickers": single_ticker})
+        _collect_markets(orjson.loads(r.content).get("markets", []), out)
+
+    # Batches are packed under MAX_URL_LENGTH by the caller
+    try:
+        r = _api_request_with_retry(session, "GET", url, params={"tickers": ",".join(batch)})
+        _collect_markets(orjson.loads(r.content).get("markets", []), out)
+    except Exception as e:
+        _log(f"  ✗ Error in batch of {len(batch)} tickers: {e}")
+        # Try individual tickers as fallback
+        for single_ticker in batch:
+            try:
+                _fetch_single(single_ticker)
+            except Exception as single_e:
+                _log(f"  ✗ Error fetching single ticker {single_ticker}: {single_e}")
+
+    return out
+
+
+def _lookup_markets(tickers, session: requests.Session):
+    out = {}
+    if not tickers:
+        return out
+
+    # Pack as many tickers per request as the URL budget allows instead of
+    # guessing a fixed batch size from average ticker length.
+    base_len = len(f"{API_HOST}/markets") + len("?tickers=")
+    batches = list(_pack_by_url_length(sorted(tickers), base_len, TICKER_BATCH))
+    _log(f"Fetching market metadata for {len(tickers)} tickers in {len(batches)} batch(es) "
+         f"across {LOOKUP_WORKERS} workers...")
+
+    # Batches are independent and I/O-bound; run them concurrently, with the
+    # shared token bucket keeping aggregate request rate under the cap.
+    # Sorted batches are stable across runs (cache-friendly if the API ever caches).
+    with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as ex:
+        futures = [ex.submit(_fetch_market_batch, session, batch) for batch in batches]
+        for f in as_completed(futures):
+            out.update(f.result())
+
+    return out
+
+
+def _fetch_event_batch(session: requests.Session, batch):
+    path = "/events"
+    url = f"{API_HOST}{path}"
+    out = {}
+
+    try:
+        r = _api_request_with_retry(session, "GET", url, params={"event_tickers": ",".join(batch)})
+        events = orjson.loads(r.content).get("events", [])
+
+        for e in events:
+            evt = (e.get("ticker") or e.get("event_ticker") or "").strip()
+            cat = (e.get("category") or "").strip()
+            if evt:
+                out[evt] = cat
+    except Exception as e:
+        _log(f"  ✗ Error in event batch of {len(batch)}: {e}")
+
+    return out
+
+
+def _lookup_event_categories(event_tickers, session: requests.Session):
+    out = {}
+    if not event_tickers:
+        return out
+
+    base_len = len(f"{API_HOST}/events") + len("?event_tickers=")
+    batches = list(_pack_by_url_length(sorted(event_tickers), base_len, EVENT_BATCH))
+    _log(f"Fetching event categories for {len(event_tickers)} event_ticker(s) in {len(batches)} batch(es) "
+         f"across {LOOKUP_WORKERS} workers...")
+
+    with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as ex:
+        futures = [ex.submit(_fetch_event_batch, session, batch) for batch in batches]
+        for f in as_completed(futures):
+            out.update(f.result())
+
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def classify_sport(ticker: str, category: str, event_ticker: str) -> str:
+    for field in (ticker, category, event_ticker):
+        if not field:
+            continue
+        m = _sport_union().search(field)
+        if m:
+            return m.lastgroup
+    return ""
+
+
+def main():
+    if not all([API_KEY_ID, PRIVATE_KEY, SUPABASE_URL, SUPABASE_SERVICE_KEY]):
+        _log("❌ Missing required environment variables")
+        _log("Required: KALSHI_API_KEY_ID, KALSHI_PRIVATE_KEY, SUPABASE_URL, SUPABASE_SERVICE_KEY")
+        sys.exit(1)
+
+    tz = ZoneInfo(TIMEZONE)
+    
+    end_d = date.today() - timedelta(days=1)
+    start_d = end_d - timedelta(days=LOOKBACK_DAYS - 1)
+    
+    _log(f"Processing dates: {start_d} to {end_d} (timezone: {TIMEZONE}, lookback: {LOOKBACK_DAYS} days)")
+
+    key = _load_private_key()
+    
+    session = requests.Session()
+    # Default urllib3 pools hold 10 connections; size them for the batch
+    # lookups so every request reuses a warm TLS connection.
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": "KalshiDailyCron/1.0", "Connection": "keep-alive"})
+    session.auth = KalshiAuth(key)
+    if PROXIES:
+        session.proxies.update(PROXIES)
+        _log(f"Using proxies: {PROXIES}")
+    if CORP_CA_PATH:
+        session.verify = CORP_CA_PATH
+
+    # Aggregate page by page as they arrive so raw trades are never held
+    # beyond the current page; only the per-day aggregates accumulate.
+    totals_by_day = Counter()
+    ticker_by_day = defaultdict(Counter)
+    unique_tickers = set()
+
+    # Bisect epoch seconds into precomputed local-day bounds instead of
+    # a per-row tz conversion; bounds come from ZoneInfo so DST is exact.
+    day_labels = []
+    day_uppers = []
+    for d in _daterange_inclusive(start_d, end_d):
+        lo, hi = _to_utc_bounds_for_local_day(d, tz)
+        day_labels.append(d.isoformat())
+        day_uppers.append(hi)
+    window_start, _ = _to_utc_bounds_for_local_day(start_d, tz)
+
+    # The trades response shape is fixed, so probe for the timestamp field
+    # once on the first page and pin it for the rest of the run.
+    ts_field = None
+
+    def _bucket_batch(batch):
+        nonlocal ts_field
+        if not batch:
+            return
+        df = pd.DataFrame(batch)
+        if ts_field is None:
+            ts_field = next((f for f in ("created_time", "created_ts", "ts", "timestamp") if f in df.columns), None)
+        if ts_field is None or ts_field not in df.columns:
+            return
+        df["_ts"] = _parse_ts_series(df[ts_field])
+        df = df.dropna(subset=["_ts"])
+
+        # Normalize to ns first: pandas 3.x parses ISO strings to [us]
+        # resolution, and a raw astype(int64) there would be off by 1000x.
+        epochs = (df["_ts"].astype("datetime64[ns, UTC]").astype("int64") // 10**9).to_numpy()
+        idx = np.searchsorted(day_uppers, epochs, side="right")
+        keep = (epochs >= window_start) & (idx < len(day_labels))
+        if not keep.all():
+            df = df.loc[keep].copy()
+            idx = idx[keep]
+        qty = pd.to_numeric(df.get("count"), errors="coerce").fillna(0).astype("int64").to_numpy()
+
+        # bincount over day / (day, ticker-code) indices is a native-code sum
+        # reduction, replacing the pandas groupby machinery per page.
+        # Accumulators are keyed by integer day index; labels are applied
+        # only when the final rows are emitted.
+        day_sums = np.bincount(idx, weights=qty, minlength=len(day_labels))
+        for di in np.nonzero(day_sums)[0]:
+            totals_by_day[int(di)] += int(day_sums[di])
+
+        if "ticker" in df.columns:
+            tk_vals = df["ticker"].to_numpy()
+            has_tk = pd.notna(tk_vals)
+            if has_tk.any():
+                codes, uniq = pd.factorize(tk_vals[has_tk])
+                unique_tickers.update(uniq)
+                pair_sums = np.bincount(idx[has_tk] * len(uniq) + codes, weights=qty[has_tk])
+                for p in np.nonzero(pair_sums)[0]:
+                    ticker_by_day[int(p // len(uniq))][uniq[p % len(uniq)]] += int(pair_sums[p])
+
+    _get_all_trades(start_d, end_d, tz, key, _bucket_batch)
+
+    for di in range(len(day_labels)):
+        totals_by_day.setdefault(di, 0)
+        ticker_by_day.setdefault(di, {})
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+    # Most sports tickers classify from the ticker text alone; only the
+    # unclassified tail needs market/event metadata at all.
+    by_name = {tk for tk in unique_tickers if classify_sport(tk, "", "")}
+    needs_meta = unique_tickers - by_name
+
+    # A ticker's (category, event_ticker) rarely changes, so reuse rows
+    # persisted by earlier runs and only hit Kalshi for tickers we've not seen.
+    cached = {}
+    try:
+        for batch in _chunks(sorted(needs_meta), 200):
+            resp = supabase.table("market_metadata").select("*").in_("ticker", batch).execute()
+            for rec in resp.data or []:
+                cached[rec["ticker"]] = (rec.get("category") or "", rec.get("src") or "none", rec.get("event_ticker") or "")
+    except Exception as e:
+        _log(f"  ⚠️  Could not read market_metadata cache: {e}")
+
+    missing = needs_meta - cached.keys()
+    _log(f"Unique tickers: {len(unique_tickers)} "
+         f"({len(by_name)} classified by name, {len(cached)} cached, {len(missing)} to fetch)")
+
+    markets_map = _lookup_markets(missing, session) if missing else {}
+
+    final_category = dict(cached)
+    for tk in by_name:
+        final_category[tk] = ("", "ticker", "")
+
+    # One pass over markets_map: categorized tickers resolve immediately,
+    # blanks are queued for the event-category lookup.
+    pending_evt = []
+    blanks_evt = set()
+    for tk, info in markets_map.items():
+        # Values were stripped/defaulted at ingestion in _collect_markets
+        cat = info["category"]
+        evt = info["event_ticker"]
+        if cat:
+            final_category[tk] = (cat, "market", evt)
+        else:
+            pending_evt.append((tk, evt))
+            if evt:
+                blanks_evt.add(evt)
+
+    event_cat_map = _lookup_event_categories(blanks_evt, session) if blanks_evt else {}
+
+    for tk, evt in pending_evt:
+        ev_cat = event_cat_map.get(evt, "") if evt else ""
+        if ev_cat:
+            final_category[tk] = (ev_cat, "event", evt)
+        else:
+            final_category[tk] = ("", "none", evt)
+
+    # Persist newly resolved tickers for future runs; unresolved ("none")
+    # tickers are left out so they get retried until metadata appears.
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    new_rows = [
+        {"ticker": tk, "category": cat, "src": src, "event_ticker": evt, "fetched_at": fetched_at}
+        for tk, (cat, src, evt) in final_category.items()
+        if tk not in cached and src in ("market", "event")
+    ]
+    if new_rows:
+        try:
+            for batch in _chunks(new_rows, 500):
+                supabase.table("market_metadata").upsert(batch, on_conflict="ticker").execute()
+            _log(f"Cached metadata for {len(new_rows)} new ticker(s)")
+        except Exception as e:
+            _log(f"  ⚠️  Could not update market_metadata cache: {e}")
+
+    # Classify each unique ticker once instead of once per (day, ticker)
+    sport_by_ticker = {tk: classify_sport(tk, cat, evt) for tk, (cat, _src, evt) in final_category.items()}
+
+    _log("Computing daily volumes...")
+    rows = []
+    for di in sorted(totals_by_day.keys()):
+        day_str = day_labels[di]
+        total = totals_by_day[di]
+        per_ticker = ticker_by_day[di]
+        
+        sport_volumes = {sport: 0 for sport in SPORT_CATEGORIES}
+        sports_total = 0
+
+        for tk, q in per_ticker.items():
+            sport = sport_by_ticker.get(tk)
+            if sport is None:
+                # Ticker missing from metadata; classify on ticker text alone
+                # (lru_cache makes the repeat calls cheap)
+                sport = classify_sport(tk, "", "")
+            if sport:
+                sport_volumes[sport] += q
+                sports_total += q
+
+        pct = (sports_total / total * 100.0) if total else 0.0
+        row = {
+            "date": day_str,
+            "total_volume": total,
+            "sports_volume": sports_total,
+            "sports_pct": round(pct, 4),
+            **{f"{sport}_volume": sport_volumes[sport] for sport in SPORT_CATEGORIES},
+        }
+        rows.append(row)
+        _log(f"  {day_str}: total={total:,} sports={sports_total:,} ({pct:.2f}%)")
+
+    _log(f"\nUploading {len(rows)} rows to Supabase...")
+
+    # One round trip (per 500-row chunk) instead of one per row
+    for chunk in _chunks(rows, 500):
+        try:
+            supabase.table("daily_volumes").upsert(chunk, on_conflict="date").execute()
+            for row in chunk:
+                _log(f"  ✓ Upserted {row['date']}")
+        except Exception as e:
+            _log(f"  ✗ Error upserting batch of {len(chunk)} row(s): {e}")
+
+    _log("\n✅ Done!")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        _log(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+